@@ -40,13 +40,67 @@ Please view README.md for instructions on how to use the client.
 import argparse
 import sys
 import csv
+import io
 import json
 import os.path
-from datetime import date, timedelta, datetime
-import requests
-
-
-def load_settings(settings_path, tokens_path, csv_path, verbose, iso_dates):
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import date, timedelta, datetime, timezone
+from functools import lru_cache
+from operator import itemgetter
+from pathlib import Path
+from urllib.parse import unquote, urlencode
+from urllib.request import getproxies, proxy_bypass
+import urllib3
+
+try:
+    # Use orjson to decode JSON if it is installed as it is considerably
+    # faster than the standard library and accepts bytes directly
+    import orjson
+    _json_loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    _json_loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+try:
+    # Use certifi's CA bundle to verify certificates if it is installed, as
+    # the requests library does, as not every system has a certificate store
+    import certifi
+except ImportError:
+    certifi = None
+
+# Systems hosting instances of the Public API
+SYSTEMS = ('clwrota', 'medirota')
+
+# Maximum number of requests made to the Public API concurrently
+MAX_WORKERS = 16
+
+# Number of Public API instances, and connections to each instance, that the
+# pool manager keeps open for reuse
+CONNECTION_POOL_SIZE = 32
+
+# Timeout in seconds for connecting to and reading from the Public API
+REQUEST_TIMEOUT = 30
+
+# How long a Public API token is assumed to be valid for after logging in, and
+# how long before then a new token is requested
+TOKEN_LIFETIME = timedelta(hours=24)
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+
+# Status codes which can mean the Public API rejected a token. The token is
+# part of the url, so a stale token may also be reported as not found.
+INVALID_TOKEN_STATUSES = (401, 403, 404, 419)
+
+# Buffer size used when writing CSV output, so large exports are written in
+# fewer, larger writes
+CSV_BUFFER_SIZE = 1 << 20
+
+# Values treated as missing data when checking required fields
+EMPTY_VALUES = (None, '', [])
+
+
+def load_settings(settings_path):
 
     """
     Loads settings.json file.
@@ -55,17 +109,16 @@ def load_settings(settings_path, tokens_path, csv_path, verbose, iso_dates):
     settings_file_path = os.path.join(settings_path or '', 'settings.json')
 
     try:
-        with open(settings_file_path, 'r') as f:
-            settings = json.load(f)
+        settings = _json_loads(Path(settings_file_path).read_bytes())
     except FileNotFoundError as error:
         error_quit(str(error))
-    except json.decoder.JSONDecodeError as error:
+    except JSONDecodeError as error:
         error_quit(str(error))
 
-    validate_settings(settings, tokens_path, csv_path, verbose, iso_dates)
+    return settings
 
 
-def validate_settings(settings, tokens_path, csv_path, verbose, iso_dates):
+def validate_settings(settings):
 
     """
     Validates the values chosen in the settings file.
@@ -78,10 +131,9 @@ def validate_settings(settings, tokens_path, csv_path, verbose, iso_dates):
         settings['required_fields'] = []
 
     # Check systems are of the valid choices
-    systems = ('clwrota', 'medirota')
     for department in settings['departments']:
-        if department['system'] not in systems:
-            error_quit('System must be one of: ' + str(systems))
+        if department['system'] not in SYSTEMS:
+            error_quit('System must be one of: ' + str(SYSTEMS))
 
     # Check additional fields are present in the return data set
     if not all(
@@ -96,172 +148,295 @@ def validate_settings(settings, tokens_path, csv_path, verbose, iso_dates):
     except ValueError:
         error_quit('Ensure day_range is an integer')
 
-    load_tokens(settings, tokens_path, systems, csv_path, verbose, iso_dates)
-
 
-def load_tokens(settings, tokens_path, systems, csv_path, verbose, iso_dates):
+def load_tokens(settings, tokens_file_path):
 
     """
     Loads tokens.json file.
     """
 
-    tokens_file_path = os.path.join(tokens_path or '', 'tokens.json')
-
     # Load tokens file
     try:
-        with open(tokens_file_path, 'r') as f:
-            tokens_data = json.load(f)
+        tokens_data = _json_loads(Path(tokens_file_path).read_bytes())
     except FileNotFoundError:
         # Construct tokens dictionary
         tokens_data = {}
-        for system in systems:
+        for system in SYSTEMS:
             tokens_data[system] = {
                 department['shortname']: None
                 for department in settings['departments']
                 if department['system'] == system
             }
 
-    except json.decoder.JSONDecodeError as error:
+    except JSONDecodeError as error:
         error_quit(str(error))
 
-    authenticate(settings, tokens_data, tokens_file_path, csv_path, verbose, iso_dates)
+    return tokens_data
 
 
-def authenticate(settings, tokens_data, tokens_file_path, csv_path, verbose, iso_dates):
+def authenticate(settings, tokens_data, tokens_file_path, verbose, http, executor):
 
     """
-    Provides authentication to one or more instances of the Public API.
+    Provides authentication to one or more instances of the Public API and
+    returns the url of each department's instance including its token.
+
+    Saved tokens are used without being checked until they are due to expire.
+    If the Public API rejects a token before then, a new one is requested when
+    the rota data is gathered.
     """
 
-    department_urls = []
+    departments = settings['departments']
+    tokens = []
+    now = datetime.now(timezone.utc)
 
     # Iterate through each department described in the settings file
-    for department in settings['departments']:
+    for department in departments:
 
         shortname = department['shortname']
         system = department['system']
 
-        # Define base Public API url
-        base_url = 'https://{}.{}.com/publicapi/'.format(
-            shortname,
-            system
-        )
-
         if verbose:
             sys.stderr.write('Getting token for ' + system + ' ' + shortname + '\n')
 
         # Get department token from tokens data
+        saved_token = tokens_data.get(system, {}).get(shortname)
+
         try:
-            token = tokens_data[system][shortname]
+            token = saved_token['token']
+            expires_at = datetime.fromisoformat(saved_token['expires_at'])
+            valid_token = expires_at - TOKEN_EXPIRY_MARGIN > now
 
-            # Access Public API landing page with token
-            url = '{}{}/landing/'.format(
-                base_url,
-                token
-            )
+        except (TypeError, KeyError, ValueError):
+            # No token saved, or a token saved without an expiry time
+            valid_token = False
 
-            response = requests.get(url)
-            valid_token = response.status_code in (200, 420)
+        tokens.append(token if valid_token else None)
 
-        except KeyError:
-            valid_token = False
+    # Login to the departments without a valid token concurrently
+    expired = [index for index, token in enumerate(tokens) if token is None]
+    new_tokens = executor.map(
+        lambda index: login(http, departments[index], verbose),
+        expired
+    )
 
-        except requests.ConnectionError as error:
-            error_quit(str(error))
+    saved_tokens = 0
 
-        if not valid_token:
-            if verbose:
-                sys.stderr.write('New token required for ' + system + ' ' + shortname + '\n')
+    try:
+        for index, token in zip(expired, new_tokens):
+            save_token(tokens_data, departments[index], token, verbose)
+            tokens[index] = token
+            saved_tokens += 1
 
-            url = base_url + 'login/'
+    except LoginError as error:
+        error_quit(str(error))
 
-            try:
-                # Login to the Public API to get a new token
-                response = requests.post(
-                    url,
-                    data={'username': department['auth']['username'],
-                          'password': department['auth']['password']},
-                    headers={'Accept': 'application/json'}
-                )
-                response.raise_for_status()
+    finally:
+        # Write the tokens file once for all of the new tokens, including
+        # those got before another department failed to login, and not at all
+        # if no new tokens were needed
+        if saved_tokens:
+            write_tokens(tokens_data, tokens_file_path)
 
-                token = response.json()['token']
+    return [
+        get_base_url(department) + token
+        for department, token in zip(departments, tokens)
+    ]
 
-                if verbose:
-                    sys.stderr.write('Saving token for ' + system + ' ' + shortname + '\n')
 
-                # Save token to tokens.json file
-                tokens_data[system][shortname] = token
+class LoginError(Exception):
+
+    """
+    Raised when a new token cannot be got from an instance of the Public API.
+    """
+
+
+def login(http, department, verbose):
+
+    """
+    Logs in to an instance of the Public API to get a new token.
+
+    Logins are made from worker threads, so errors are raised as a LoginError
+    for the main thread to report, rather than quitting the client here.
+    """
+
+    shortname = department['shortname']
+    system = department['system']
+
+    if verbose:
+        sys.stderr.write('New token required for ' + system + ' ' + shortname + '\n')
+
+    url = get_base_url(department) + 'login/'
 
-                with open(tokens_file_path, 'w') as tokens_file:
-                    json.dump(
-                        tokens_data,
-                        tokens_file,
-                        ensure_ascii=False,
-                        indent=4
-                    )
+    try:
+        # Login to the Public API to get a new token
+        response = http.request(
+            'POST',
+            url,
+            fields={'username': department['auth']['username'],
+                    'password': department['auth']['password']},
+            encode_multipart=False,
+            headers={'Accept': 'application/json'}
+        )
+
+    except urllib3.exceptions.HTTPError as error:
+        raise LoginError(str(error))
 
-            except requests.ConnectionError as error:
-                error_quit(str(error))
+    if response.status >= 400:
+        raise LoginError(str(decode_response(response)['error']['message']))
 
-            except requests.HTTPError:
-                error_quit(str(response.json()['error']['message']))
+    return decode_response(response)['token']
 
-        department_urls.append(base_url + token)
 
-    get_rota_data(settings, department_urls, csv_path, verbose, iso_dates)
+def save_token(tokens_data, department, token, verbose):
 
+    """
+    Saves a department's token and its expiry time to the tokens data.
+    """
 
-def get_rota_data(settings, department_urls, csv_path, verbose, iso_dates):
+    shortname = department['shortname']
+    system = department['system']
+
+    if verbose:
+        sys.stderr.write('Saving token for ' + system + ' ' + shortname + '\n')
+
+    tokens_data.setdefault(system, {})[shortname] = {
+        'token': token,
+        'expires_at': (datetime.now(timezone.utc) + TOKEN_LIFETIME).isoformat()
+    }
+
+
+def write_tokens(tokens_data, tokens_file_path):
 
     """
-    Gathers data from one or more Public API instances and compiles the data
-    into a single object.
+    Writes the tokens data to the tokens.json file.
+
+    The data is written to a temporary file which then replaces the tokens
+    file, so an interrupted write cannot leave the tokens file incomplete.
+    """
+
+    temporary_file_path = tokens_file_path + '.tmp'
+
+    with open(temporary_file_path, 'w') as tokens_file:
+        json.dump(
+            tokens_data,
+            tokens_file,
+            ensure_ascii=False,
+            indent=4
+        )
+
+    os.replace(temporary_file_path, tokens_file_path)
+
+
+def decode_response(response):
+
+    """
+    Decodes the JSON body of a Public API response.
+
+    The body is decoded from bytes, without decoding it to a string first.
+    """
+
+    return _json_loads(response.data)
+
+
+def get_base_url(department):
+
+    """
+    Returns the base Public API url for a department.
+    """
+
+    return 'https://{}.{}.com/publicapi/'.format(
+        department['shortname'],
+        department['system']
+    )
+
+
+def get_rota_data(settings, tokens_data, tokens_file_path, department_urls, verbose, http, executor):
+
     """
+    Gathers data from one or more Public API instances and compiles the data
+    into a single iterable of rows.
+
+    If a department's token is rejected, a new token is requested and that
+    department's data is requested again.
 
-    all_rota_data = []
+    Each department's data is only decoded when it is reached, so only a single
+    department's rows are held in memory while the data is being processed.
+    The requests to every department are made at once though, so the raw
+    response body of each department is held until its rows are reached.
+    """
 
     from_date = date.today()
     to_date = from_date + timedelta(days=(int(settings['day_range']) - 1))
 
-    # Iterate through PublicAPI urls
-    for department_url in department_urls:
+    parameters = urlencode({'from_date': from_date,
+                            'to_date': to_date})
+
+    def get_department_rota_url(department_url):
 
-        url = '{}/person_rota/'.format(
-            department_url
+        return '{}/person_rota/?{}'.format(
+            department_url,
+            parameters
         )
 
-        parameters = {'from_date': from_date,
-                      'to_date': to_date}
+    def get_department_rota(department_url):
+
+        # Make request to get rota data
+        return http.request(
+            'GET',
+            get_department_rota_url(department_url),
+            headers={'Accept': 'application/json'}
+        )
+
+    def iter_rota_data(responses):
 
         try:
-            # Make request to get rota data
-            response = requests.get(
-                url,
-                parameters,
-                headers={'Accept': 'application/json'}
-            )
+            for department, department_url in zip(
+                settings['departments'],
+                department_urls
+            ):
+
+                # The response is taken from the iterator rather than being
+                # zipped with the departments, as zip would keep a reference
+                # to it until the next department
+                response = next(responses)
+
+                if response.status in INVALID_TOKEN_STATUSES:
+                    try:
+                        token = login(http, department, verbose)
+                    except LoginError as error:
+                        error_quit(str(error))
+
+                    save_token(tokens_data, department, token, verbose)
+                    write_tokens(tokens_data, tokens_file_path)
+                    department_url = get_base_url(department) + token
+                    response = get_department_rota(department_url)
 
-            if verbose:
-                sys.stderr.write('Getting data from ' + response.url + '\n')
+                if verbose:
+                    sys.stderr.write('Getting data from ' + get_department_rota_url(department_url) + '\n')
 
-            response.raise_for_status()
+                if response.status >= 400:
+                    error_quit(str(decode_response(response)['error']['message']))
 
-        except requests.ConnectionError as error:
-            error_quit(str(error))
+                department_rota_data = decode_response(response)['person_rota']
 
-        except requests.HTTPError:
-            error_quit(str(response.json()['error']['message']))
+                # Release the raw response body before the rows are processed,
+                # so it is not held in memory alongside the decoded data
+                del response
 
-        department_rota_data = response.json()['person_rota']
+                # Yield the department's rows into the compiled rota data
+                yield from department_rota_data
 
-        # Add to compiled rota data
-        all_rota_data.extend(department_rota_data)
+        except urllib3.exceptions.HTTPError as error:
+            error_quit(str(error))
+
+    # Request data from all PublicAPI urls concurrently, keeping the responses
+    # in the same order as the departments in the settings file
+    responses = executor.map(get_department_rota, department_urls)
 
-    process_data(settings, all_rota_data, csv_path, verbose, iso_dates)
+    return iter_rota_data(responses)
 
 
-def process_data(settings, all_rota_data, csv_path, verbose, iso_dates):
+def process_data(settings, all_rota_data, iso_dates):
 
     """
     Applies processing to rota data.
@@ -273,41 +448,186 @@ def process_data(settings, all_rota_data, csv_path, verbose, iso_dates):
     """
 
     additional_fields = settings['additional_fields']
-    required_fields = settings['required_fields']
+    required_fields = frozenset(settings['required_fields'])
     return_data_set = settings['return_data_set']
-    processed_data = []
-
-    # Iterate through the entire person rota data set
-    for row in all_rota_data:
 
-        # Add the additional field keys and values
-        row.update(additional_fields)
+    # Additional fields have the same value for every row, so any that are
+    # required fields only need to be checked once
+    include_rows = all(
+        additional_fields[key] not in EMPTY_VALUES
+        for key in required_fields & additional_fields.keys()
+    )
+    required_fields = required_fields - additional_fields.keys()
+
+    # Work out how each column is produced once, rather than for every row.
+    # Values are taken from the row, and the additional field values are
+    # appended and put in place by index, without adding them to every row.
+    keys = list(return_data_set.keys())
+    row_keys = [key for key in keys if key not in additional_fields]
+    additional_keys = [key for key in keys if key in additional_fields]
+    additional_values = tuple(additional_fields[key] for key in additional_keys)
+
+    get_values = row_getter(row_keys)
+    reorder_values = None
+    if additional_values:
+        positions = [
+            row_keys.index(key) if key in row_keys
+            else len(row_keys) + additional_keys.index(key)
+            for key in keys
+        ]
+        reorder_values = row_getter(positions)
+
+    # If not using international date format, ISO dates and timestamps are
+    # reformatted
+    transforms = []
+    if not iso_dates:
+        for index, key in enumerate(keys):
+            if key == 'date':
+                transforms.append((index, format_date))
+            elif key == 'modified':
+                transforms.append((index, format_timestamp))
+
+    def has_required_fields(row):
 
         # Include rows that have data for all of the required fields
         # (if no required fields, all data is returned)
-        include_row = all([str(value) for key, value in row.items() if key in required_fields])
-        if include_row:
-            item = {}
-            # Iterate through the return_data_set keys and values
-            for key, value in return_data_set.items():
-
-                # If not using international date format, reformat ISO dates and timestamps
-                if not iso_dates:
-                    if key == 'date':
-                        row[key] = datetime.fromisoformat(row[key]).strftime('%d/%m/%Y')
-                    elif key == 'modified':
-                        row[key] = datetime.fromisoformat(row[key]).strftime('%d/%m/%Y %H:%M:%S')
+        return all(row.get(key) not in EMPTY_VALUES for key in required_fields)
+
+    def iter_iso_data():
+
+        # Iterate through the entire person rota data set
+        for row in all_rota_data:
+
+            if has_required_fields(row):
+                try:
+                    # Order the person rota data set values as defined in the
+                    # return data set
+                    item = get_values(row)
+                except KeyError as error:
+                    error_quit('Unknown key in return_data_set: ' + str(error))
+
+                if reorder_values:
+                    item = reorder_values(item + additional_values)
 
+                yield item
+
+    def iter_local_data():
+
+        # Iterate through the entire person rota data set
+        for row in all_rota_data:
+
+            if has_required_fields(row):
                 try:
-                    # Update person rota data set keys to the value defined in
-                    # the return data set
-                    item.update({value: row[key]})
+                    # Order the person rota data set values as defined in the
+                    # return data set
+                    item = get_values(row)
                 except KeyError as error:
                     error_quit('Unknown key in return_data_set: ' + str(error))
 
-            processed_data.append(item)
+                if reorder_values:
+                    item = reorder_values(item + additional_values)
+
+                # Reformat the ISO dates and timestamps
+                item = list(item)
+                for index, transform in transforms:
+                    item[index] = transform(item[index])
+
+                yield item
+
+    def iter_unprocessed_data():
+
+        # Only the values of the return data set are needed from each row, so
+        # they are taken from every row by map without a Python level loop
+        try:
+            yield from map(get_values, all_rota_data)
+        except KeyError as error:
+            if error.args[0] not in row_keys:
+                raise
+            error_quit('Unknown key in return_data_set: ' + str(error))
+
+    def iter_excluded_data():
+
+        # No rows can be included, but the rota data is still gathered so that
+        # any errors from the Public API are reported. As with rows excluded
+        # by the required fields, the rows are not checked for unknown keys.
+        for row in all_rota_data:
+            pass
+
+        yield from ()
+
+    if not include_rows:
+        return iter_excluded_data()
+
+    if not (required_fields or additional_values or transforms):
+        return iter_unprocessed_data()
+
+    # Rows are processed as they are written, so the processed data set is
+    # never held in memory as a whole. Whether dates are reformatted is
+    # decided once here, rather than for every row.
+    if transforms:
+        return iter_local_data()
+
+    return iter_iso_data()
+
+
+def row_getter(keys):
+
+    """
+    Returns a function that gets the values of the given keys from a row as a
+    tuple.
+
+    The values are looked up by operator.itemgetter in a single call, so the
+    per-row lookups run in C rather than as Python bytecode.
+    """
+
+    if not keys:
+        return lambda row: ()
 
-    write_csv(return_data_set.values(), processed_data, csv_path, verbose)
+    if len(keys) == 1:
+        # itemgetter returns a single value rather than a tuple for one key
+        get_value = itemgetter(keys[0])
+        return lambda row: (get_value(row),)
+
+    return itemgetter(*keys)
+
+
+@lru_cache(maxsize=None)
+def format_date(value):
+
+    """
+    Reformats an ISO date as a dd/mm/yyyy date.
+
+    A rota only spans day_range distinct dates, so each one is reformatted once
+    and the result reused for every other row on that date.
+    """
+
+    # The Public API provides dates as yyyy-mm-dd, which can be reformatted by
+    # slicing rather than parsing them
+    if len(value) >= 10 and value[4] == value[7] == '-':
+        return value[8:10] + '/' + value[5:7] + '/' + value[0:4]
+
+    return datetime.fromisoformat(value).strftime('%d/%m/%Y')
+
+
+def format_timestamp(value):
+
+    """
+    Reformats an ISO timestamp as a dd/mm/yyyy hh:mm:ss timestamp.
+    """
+
+    # The Public API provides timestamps as yyyy-mm-ddThh:mm:ss followed by
+    # optional fractions of a second and time zone, which can be reformatted by
+    # slicing rather than parsing them
+    if (
+        len(value) >= 19
+        and value[4] == value[7] == '-'
+        and value[10] in 'T '
+        and value[13] == value[16] == ':'
+    ):
+        return (value[8:10] + '/' + value[5:7] + '/' + value[0:4]
+                + ' ' + value[11:19])
+
+    return datetime.fromisoformat(value).strftime('%d/%m/%Y %H:%M:%S')
 
 
 def write_csv(column_headers, processed_data, csv_path, verbose):
@@ -332,16 +652,26 @@ def write_csv(column_headers, processed_data, csv_path, verbose):
         if verbose:
             sys.stderr.write('Writing CSV to ' + csv_file_path + '\n')
 
+        # Rows are processed while the file is written, so write to a temporary
+        # file which only replaces the CSV file once every row is written
+        temporary_file_path = csv_file_path + '.tmp'
+
         try:
-            # Write a CSV file to the defined output path
-            with open(csv_file_path, 'w', newline='') as output_file:
-                writer = csv.DictWriter(
-                    output_file,
-                    fieldnames=column_headers
-                )
-                writer.writeheader()
-                for row in processed_data:
-                    writer.writerow(row)
+            try:
+                # Write a CSV file to the defined output path
+                with open(temporary_file_path, 'w', newline='', buffering=CSV_BUFFER_SIZE) as output_file:
+                    writer = csv.writer(output_file)
+                    writer.writerow(column_headers)
+                    writer.writerows(processed_data)
+
+            except BaseException:
+                # Don't leave a partially written file behind on any error,
+                # including those which exit the client
+                with suppress(FileNotFoundError):
+                    os.remove(temporary_file_path)
+                raise
+
+            os.replace(temporary_file_path, csv_file_path)
 
         except (csv.Error, ValueError) as error:
             error_quit(str(error))
@@ -352,14 +682,33 @@ def write_csv(column_headers, processed_data, csv_path, verbose):
         if verbose:
             sys.stderr.write('Writing CSV to stdout\n')
 
+        stdout_buffer = getattr(sys.stdout, 'buffer', None)
+
         try:
-            writer = csv.DictWriter(
-                sys.stdout,
-                fieldnames=column_headers
-            )
-            writer.writeheader()
-            for row in processed_data:
-                writer.writerow(row)
+            if stdout_buffer is None:
+                # Write to stdout directly if it has no underlying binary buffer
+                output_file = sys.stdout
+            else:
+                # Write to stdout through a buffer of the same size as for
+                # files, using the encoding and error handling of stdout
+                sys.stdout.flush()
+                output_file = io.TextIOWrapper(
+                    io.BufferedWriter(stdout_buffer, buffer_size=CSV_BUFFER_SIZE),
+                    encoding=sys.stdout.encoding,
+                    errors=sys.stdout.errors,
+                    newline=''
+                )
+
+            try:
+                writer = csv.writer(output_file)
+                writer.writerow(column_headers)
+                writer.writerows(processed_data)
+
+            finally:
+                # Flush and detach the wrappers rather than closing them, so
+                # stdout itself is left open
+                if output_file is not sys.stdout:
+                    output_file.detach().detach()
 
         except (csv.Error, ValueError) as error:
             error_quit(str(error))
@@ -368,6 +717,123 @@ def write_csv(column_headers, processed_data, csv_path, verbose):
         sys.stderr.write('Export complete!\n')
 
 
+def main(settings_path, tokens_path, csv_path, verbose, iso_dates):
+
+    """
+    Exports rota data from the Public API instances in the settings file.
+
+    Each stage passes its result to the next, with the rota data passed from
+    stage to stage as generators, so rows are requested, processed and
+    written as the CSV output is generated.
+    """
+
+    settings = load_settings(settings_path)
+    validate_settings(settings)
+
+    tokens_file_path = os.path.join(tokens_path or '', 'tokens.json')
+    tokens_data = load_tokens(settings, tokens_file_path)
+
+    # Share one pool manager and thread pool between authentication and
+    # gathering rota data, so connections to each Public API instance are
+    # reused
+    http = create_pool_manager()
+
+    with http, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        department_urls = authenticate(
+            settings,
+            tokens_data,
+            tokens_file_path,
+            verbose,
+            http,
+            executor
+        )
+
+        all_rota_data = get_rota_data(
+            settings,
+            tokens_data,
+            tokens_file_path,
+            department_urls,
+            verbose,
+            http,
+            executor
+        )
+
+        processed_data = process_data(settings, all_rota_data, iso_dates)
+
+        write_csv(settings['return_data_set'].values(), processed_data, csv_path, verbose)
+
+
+def create_pool_manager():
+
+    """
+    Creates the urllib3 pool manager used to make requests to the Public API.
+
+    Certificates are verified against the CA bundle set by REQUESTS_CA_BUNDLE
+    or CURL_CA_BUNDLE, then certifi's bundle if it is installed, otherwise the
+    system's certificate store. If an https proxy is configured in the
+    environment, requests are made through it, including any username and
+    password in its url, other than to hosts excluded from it by no_proxy.
+    """
+
+    options = {
+        'num_pools': CONNECTION_POOL_SIZE,
+        'maxsize': CONNECTION_POOL_SIZE,
+        'retries': urllib3.Retry(total=2, backoff_factor=0.2),
+        'timeout': REQUEST_TIMEOUT
+    }
+
+    ca_bundle = os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE')
+    if not ca_bundle and certifi:
+        ca_bundle = certifi.where()
+
+    if ca_bundle and os.path.isdir(ca_bundle):
+        options['ca_cert_dir'] = ca_bundle
+    elif ca_bundle:
+        options['ca_certs'] = ca_bundle
+
+    proxy_url = getproxies().get('https')
+    if proxy_url:
+        proxy_auth = urllib3.util.parse_url(proxy_url).auth
+        if proxy_auth:
+            options['proxy_headers'] = urllib3.util.make_headers(
+                proxy_basic_auth=unquote(proxy_auth)
+            )
+
+        return BypassProxyManager(proxy_url, **options)
+
+    return urllib3.PoolManager(**options)
+
+
+class BypassProxyManager(urllib3.ProxyManager):
+
+    """
+    Proxy manager which connects directly to hosts excluded from the proxy by
+    the no_proxy environment variable.
+
+    The choice is made for each host a connection is made to, so it also
+    applies to any redirects.
+    """
+
+    def __init__(self, proxy_url, **options):
+
+        super().__init__(proxy_url, **options)
+
+        options.pop('proxy_headers', None)
+        self.direct = urllib3.PoolManager(**options)
+
+    def connection_from_host(self, host, port=None, scheme='http', pool_kwargs=None):
+
+        if proxy_bypass(host):
+            return self.direct.connection_from_host(host, port, scheme, pool_kwargs)
+
+        return super().connection_from_host(host, port, scheme, pool_kwargs)
+
+    def clear(self):
+
+        super().clear()
+        self.direct.clear()
+
+
 def error_quit(message):
 
     """
@@ -421,4 +887,4 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
-    load_settings(args.settings, args.tokens, args.csv, args.verbose, args.iso_dates)
+    main(args.settings, args.tokens, args.csv, args.verbose, args.iso_dates)